@@ -0,0 +1,218 @@
+# Script to pack nfl.db (and the scraped team stat csvs) into a single snapshot file and load it back
+# Lets a new machine skip the multi-hour construct_pbp_db scrape
+#
+# Usage:
+#   python dbSnapshot.py export nfl-snapshot.zip
+#   python dbSnapshot.py import nfl-snapshot.zip
+
+import os
+import re
+import json
+import time
+import sqlite3
+import zipfile
+import hashlib
+import argparse
+
+from pbpAnalysis import DB_URL, game_table_pattern, game_season
+
+
+SNAPSHOT_VERSION = 1
+
+# Same db pbpAnalysis reads (NFL_DB_URL if set), when it's a sqlite file
+if DB_URL.startswith('sqlite:///'):
+    db_path = DB_URL[len('sqlite:///'):]
+else:
+    db_path = os.path.join('..', 'db', 'nfl.db')
+data_dir = os.path.join('..', 'data')
+
+# Fixed member timestamps so the same db always packs to the same bytes
+zip_date = (1980, 1, 1, 0, 0, 0)
+
+schedule_table_pattern = re.compile(r'^schedule(\d{4})$')
+
+
+def table_season(table):
+    '''
+    Returns the season a table belongs to, or None for tables that span seasons (i.e. game_plan)
+
+    Game tables follow pbpAnalysis.game_table_pattern and game_season
+    '''
+    m = game_table_pattern.match(table)
+    if m is not None:
+        return game_season(m.group(2))
+    m = schedule_table_pattern.match(table)
+    if m is not None:
+        return int(m.group(1))
+    return None
+
+def _write_member(zf, name, payload, manifest):
+    info = zipfile.ZipInfo(name, date_time=zip_date)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    zf.writestr(info, payload, compresslevel=9)
+    manifest['members'][name] = hashlib.sha256(payload).hexdigest()
+
+def export_snapshot(path, db=db_path, data=data_dir, include_data=True):
+    '''
+    Writes a versioned, compressed and checksummed snapshot of nfl.db to a single zip file
+
+    Tables are grouped into one member per season (plus one for tables that span seasons),
+    rows are written in rowid order and member timestamps are fixed, so the output is deterministic
+
+    parameters:
+        path : str; snapshot file to write
+        db : str; path to nfl.db (default NFL_DB_URL's file, else ../db/nfl.db)
+        data : str; directory of scraped csvs to include (default ../data)
+        include_data : boolean (default True); if False, only the db is packed
+
+    returns:
+        manifest - dict; snapshot version, table schemas and sha256 of every member
+    '''
+    con = sqlite3.connect(f'file:{db}?mode=ro', uri=True)
+    schema = con.execute("SELECT type, name, tbl_name, sql FROM sqlite_master "
+                         "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()
+
+    manifest = {'version': SNAPSHOT_VERSION, 'tables': {}, 'indexes': [], 'members': {}}
+    chunks = {}
+    for kind, name, table, sql in schema:
+        if kind == 'table':
+            season = table_season(name)
+            manifest['tables'][name] = {'sql': sql, 'season': season}
+            chunks.setdefault('other' if season is None else str(season), []).append(name)
+        elif kind == 'index':
+            manifest['indexes'].append(sql)
+
+    with zipfile.ZipFile(path, 'w') as zf:
+        for chunk in sorted(chunks):
+            tables = {}
+            for name in chunks[chunk]:
+                rows = con.execute(f'SELECT * FROM "{name}" ORDER BY rowid').fetchall()
+                tables[name] = rows
+                manifest['tables'][name]['rows'] = len(rows)
+            payload = json.dumps(tables, sort_keys=True, separators=(',', ':')).encode()
+            _write_member(zf, f'seasons/{chunk}.json', payload, manifest)
+
+        if include_data and os.path.isdir(data):
+            for root, _, files in sorted(os.walk(data)):
+                for f in sorted(files):
+                    if not f.endswith('.csv'):
+                        continue
+                    full_path = os.path.join(root, f)
+                    with open(full_path, 'rb') as fh:
+                        payload = fh.read()
+                    name = 'data/' + os.path.relpath(full_path, data).replace(os.sep, '/')
+                    _write_member(zf, name, payload, manifest)
+
+        info = zipfile.ZipInfo('manifest.json', date_time=zip_date)
+        zf.writestr(info, json.dumps(manifest, sort_keys=True, indent=1))
+
+    con.close()
+    print(f'Snapshot of {len(manifest["tables"])} tables written to {path}')
+    return manifest
+
+def _remove_db(db):
+    for path in [db, db + '-wal', db + '-shm', db + '-journal']:
+        if os.path.exists(path):
+            os.remove(path)
+
+def import_snapshot(path, db=db_path, data=data_dir, overwrite=False):
+    '''
+    Loads a snapshot written by export_snapshot into a new nfl.db
+
+    Every member is checked against its sha256 before anything is written. Rows are bulk-inserted
+    into a temp db next to the target with synchronous=OFF, one transaction per season chunk,
+    and indexes are only built once all rows are in. The temp db then replaces the target,
+    so a failed import never leaves a half-loaded nfl.db. The db is left in WAL mode
+
+    parameters:
+        path : str; snapshot file to read
+        db : str; path of the db to create (default NFL_DB_URL's file, else ../db/nfl.db)
+        data : str; directory to restore scraped csvs to (default ../data)
+        overwrite : boolean (default False); if True, replaces an existing db and csvs
+    '''
+    start = time.time()
+
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read('manifest.json'))
+        if manifest['version'] != SNAPSHOT_VERSION:
+            raise ValueError(f'Snapshot version {manifest["version"]} not supported (expected {SNAPSHOT_VERSION})')
+
+#        Checking every member up front so a corrupt chunk fails before anything is touched
+        for name, checksum in manifest['members'].items():
+            h = hashlib.sha256()
+            with zf.open(name) as fh:
+                for block in iter(lambda: fh.read(1 << 20), b''):
+                    h.update(block)
+            if h.hexdigest() != checksum:
+                raise ValueError(f'Checksum mismatch for {name} in {path}')
+
+        csv_members = sorted(m for m in manifest['members'] if m.startswith('data/'))
+        csv_paths = {m: os.path.join(data, *m.split('/')[1:]) for m in csv_members}
+        if not overwrite:
+            existing = [db] if os.path.exists(db) else []
+            existing += [p for p in csv_paths.values() if os.path.exists(p)]
+            if existing:
+                raise FileExistsError(f'{", ".join(existing)} already exist(s), pass overwrite=True to replace them')
+
+        os.makedirs(os.path.dirname(os.path.abspath(db)), exist_ok=True)
+        tmp_db = db + '.loading'
+        _remove_db(tmp_db)
+        con = None
+        try:
+            con = sqlite3.connect(tmp_db, isolation_level=None)
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=OFF')
+            con.execute('PRAGMA temp_store=MEMORY')
+            con.execute('PRAGMA cache_size=-200000')
+
+            for name, table in sorted(manifest['tables'].items()):
+                con.execute(table['sql'])
+
+            for member in sorted(m for m in manifest['members'] if m.startswith('seasons/')):
+                tables = json.loads(zf.read(member))
+                con.execute('BEGIN')
+                for name, rows in tables.items():
+                    if not rows:
+                        continue
+                    params = ', '.join('?' * len(rows[0]))
+                    con.executemany(f'INSERT INTO "{name}" VALUES ({params})', rows)
+                con.execute('COMMIT')
+
+#            Deferred until the rows are in so each index is built in one pass
+            for sql in manifest['indexes']:
+                con.execute(sql)
+            con.execute('PRAGMA synchronous=NORMAL')
+            con.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            con.close()
+        except BaseException:
+            if con is not None:
+                con.close()
+            _remove_db(tmp_db)
+            raise
+
+#        A stale -wal left next to the old db would be replayed into the new one
+        _remove_db(db)
+        os.replace(tmp_db, db)
+
+        for member in csv_members:
+            os.makedirs(os.path.dirname(csv_paths[member]), exist_ok=True)
+            with open(csv_paths[member], 'wb') as fh:
+                fh.write(zf.read(member))
+
+    print(f'{len(manifest["tables"])} tables loaded into {db} in {time.time() - start:.1f}s')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export/import a snapshot of nfl.db')
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('path', help='snapshot file')
+    parser.add_argument('--db', default=db_path, help='path to nfl.db (default NFL_DB_URL\'s file, else ../db/nfl.db)')
+    parser.add_argument('--data', default=data_dir, help='scraped csv directory (default ../data)')
+    parser.add_argument('--no-data', action='store_true', help='export the db only')
+    parser.add_argument('--overwrite', action='store_true', help='replace an existing db and csvs on import')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_snapshot(args.path, args.db, args.data, include_data=not args.no_data)
+    else:
+        import_snapshot(args.path, args.db, args.data, overwrite=args.overwrite)
@@ -29,7 +29,7 @@ class nflDataScraper(object):
     def __init__(self, season=2020, team='All'):
         self.season = season
         self.team = team
-        self.candlestick_stats = None
+        self.candlestick_df = None
 
     def get_pt_diff(self, return_teams=True):
         '''
@@ -120,7 +120,7 @@ class nflDataScraper(object):
         url_off = f"https://widgets.sports-reference.com/wg.fcgi?css=1&site=pfr&url=%2Fyears%2F{self.season}%2F&div=div_team_stats"
         odf = pd.read_html(url_off ,displayed_only=False)[0]
         odf.columns = [c[1] for c in odf.columns] # Getting rid of multi-index for cols
-        odf = odf.iloc[0:32:]
+        odf = odf.loc[~odf['Tm'].isin(['Avg Team', 'Avg Tm/G', 'League Total'])]
 
         # re-indexing for team labels
         ddf.index, odf.index = ddf['Tm'], odf['Tm']
@@ -187,7 +187,7 @@ class nflDataScraper(object):
             save_csv : boolean, default False; if True, output dataframe saved to a csv file
 
         returns:
-            df (self.candlestick_stats): pd.DataFrame;
+            df (self.candlestick_df): pd.DataFrame;
                 DataFrame containing candlestick data for different NFL teams ina  given season. 
                     Columns: [Turnover Margin (TO), Close Game Record (CGR), Point Differential (PD)]   
         '''
@@ -204,9 +204,9 @@ class nflDataScraper(object):
         
         if save_csv:
             csv_path = os.path.join('..', 'data', f'nfl-candlestick-stats-{self.season}.csv')
-            df.to_csv(csv_path, index=False)
+            df.to_csv(csv_path, index_label='Tm')
 
-        self.candlestick_stats = df
+        self.candlestick_df = df
         return df
 
 
@@ -69,6 +69,39 @@ def getBestOdds(df):
     print("###############################################")
     return away_team, home_team, best_away_odds, best_home_odds, best_away_oddsmaker, best_home_oddsmaker
 
+def getNFLOdds(url=nfl_url):
+    '''
+    Pulls current NFL moneyline odds from the Odds-API (one API call)
+    
+    returns:
+        list of event dicts as returned by the API (id, home_team, away_team, commence_time, bookmakers)
+    '''
+    r = requests.get(url)
+    r.raise_for_status()
+    return r.json()
+
+def bestOddsByOutcome(event):
+    '''
+    Pulls best moneyline price for each team from a single Odds-API event
+    
+    parameters:
+        event - dict; one event from the Odds-API response (see getNFLOdds)
+        
+    returns:
+        best - dict {<team>: (<best american odds>, <oddsmaker>)}
+    '''
+    best = {}
+    for book in event['bookmakers']:
+        for market in book['markets']:
+            if market['key'] != 'h2h':
+                continue
+            for outcome in market['outcomes']:
+                team, price = outcome['name'], outcome['price']
+#                Higher american odds always pay more, for favorites and underdogs
+                if team not in best or price > best[team][0]:
+                    best[team] = (price, book['title'])
+    return best
+
 def moneylineArbitrage(odds_favorite, odds_dog, bet = 10):
     '''
     Determines whether a set of two american style odds produce an arbitrage
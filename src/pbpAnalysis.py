@@ -6,6 +6,24 @@ import numpy as np
 #from sqlalchemy import create_engine
 import sqlalchemy as db
 import time
+import re
+import os
+
+
+# Local play-by-play db written by construct_pbp_db or loaded by dbSnapshot (paths are relative to src/)
+# Set NFL_DB_URL to point at a db elsewhere
+DB_URL = os.environ.get('NFL_DB_URL', 'sqlite:///../db/nfl.db')
+
+# Columns common to every play-by-play table and the types we coerce them to.
+# Team score columns are named after the two teams so they differ per game
+pbp_dtypes = {'Quarter': 'object', 'Time': 'object',
+              'Down': 'float64', 'ToGo': 'float64',
+              'Location': 'object', 'Detail': 'object',
+              'EPB': 'float64', 'EPA': 'float64'
+}
+
+# Play-by-play tables are named <home team code><YYYYMMDD>, i.e. tam20210909
+game_table_pattern = re.compile(r'^([a-z]{3})(\d{8})$')
 
 
 #sample_url = "https://widgets.sports-reference.com/wg.fcgi?css=1&site=pfr&url=%2Fboxscores%2F202109090tam.htm&div=div_pbp"
@@ -30,7 +48,7 @@ team_codes = {'Dallas Cowboys':'dal', 'Atlanta Falcons':'atl',
 #              Relocated teams
               'Oakland Raiders': 'rai', 'St. Louis Rams':'ram',
               'San Diego Chargers': 'sdg', 'Washington Redskins': 'was',
-              'Tennessee Oilers': 'oti'
+              'Tennessee Oilers': 'oti', 'Washington Commanders': 'was'
               
 }
             #KC-Browns embed link:
@@ -72,75 +90,381 @@ def get_pbp(url):
     '''
     return pd.read_html(url, displayed_only=True)[0].drop(0, axis=0)
 
-def construct_pbp_db(start=1997, end=2020):
+def boxscore_url(game_id):
+    '''
+    Returns the PFR play-by-play widget url for a game_id (<home team code><YYYYMMDD>)
+    '''
+    home_team, game_date = game_id[:3], game_id[3:]
+    return f"https://widgets.sports-reference.com/wg.fcgi?css=1&site=pfr&url=%2Fboxscores%2F{game_date}0{home_team}.htm&div=div_pbp"
+
+def validate_team_codes(sched):
+    '''
+    Checks that every home & away team in a schedule has an entry in team_codes
+    
+    Raises a KeyError naming all the unmapped teams at once, rather than failing game by game mid-crawl
+    '''
+    teams = set(sched['Home Team']).union(sched['Away Team'])
+    missing = sorted(t for t in teams if t not in team_codes)
+    if missing:
+        raise KeyError(f'No team_codes entry for: {", ".join(missing)}')
+
+def plan_season(season, engine, rescrape=False):
+    '''
+    Returns every game in a season with its game_id and boxscore url
+    
+    Uses the schedule<season> table in nfl.db if a previous crawl stored one,
+    otherwise scrapes the schedule once and stores it for next time
+    
+    parameters:
+        season : int; season to plan
+        engine : sqlalchemy engine connected to nfl.db
+        rescrape : boolean (default False); if True, re-scrapes the schedule even if one is stored
+        
+    returns:
+        plan - pandas.DataFrame with columns [game_id, season, week, date, home_team, away_team, url]
+    '''
+    if not rescrape and f'schedule{season}' in db.inspect(engine).get_table_names():
+        sched = pd.read_sql(f'SELECT * FROM schedule{season}', con=engine)
+    else:
+        sched = get_nfl_schedule(season)
+        with engine.begin() as connection:
+            sched.to_sql(f'schedule{season}', con=connection, if_exists='replace')
+
+#    Games without a date haven't been scheduled yet
+    sched = sched.dropna(subset=['Date Formatted'])
+    validate_team_codes(sched)
+
+    plan = pd.DataFrame({'season': int(season),
+                         'week': sched['Week'].astype(str).values,
+                         'date': sched['Date Formatted'].astype(str).values,
+                         'home_team': sched['Home Team'].values,
+                         'away_team': sched['Away Team'].values})
+    plan['game_id'] = plan['home_team'].map(team_codes) + plan['date']
+    plan['url'] = plan['game_id'].map(boxscore_url)
+
+    return plan[['game_id', 'season', 'week', 'date', 'home_team', 'away_team', 'url']].drop_duplicates('game_id')
+
+def build_game_plan(start=1997, end=2020, replan=False, db_url=DB_URL):
+    '''
+    Builds (or extends) the game_plan table in nfl.db listing every game between two seasons
+    
+    Seasons already in game_plan are not re-planned, so schedules are only ever requested once.
+    Seasons planned mid-way (postponed or flexed games) can be rebuilt from a fresh schedule with replan
+    
+    parameters:
+        start : int; first season (default 1997)
+        end : int; season to stop before, as in construct_pbp_db (default 2020)
+        replan : boolean or iterable of ints (default False); seasons whose plan & stored schedule
+                 are dropped and rebuilt, every season in range if True
+        db_url : str; SQLAlchemy url of the db (default DB_URL)
+        
+    returns:
+        plan - pandas.DataFrame of the planned games for seasons start to end - 1
+    '''
+    engine = db.create_engine(db_url, echo=False)
+    planned = set()
+    if 'game_plan' in db.inspect(engine).get_table_names():
+        planned = set(pd.read_sql('SELECT DISTINCT season FROM game_plan', con=engine)['season'])
+
+    if replan is True:
+        replan = set(range(start, end))
+    else:
+        replan = set(int(s) for s in replan) if replan else set()
+
+    for season in range(start, end):
+        if season in planned and season not in replan:
+            continue
+        print(f'Planning {season} season')
+        plan = plan_season(season, engine, rescrape=season in replan)
+        with engine.begin() as connection:
+            if season in planned:
+                connection.execute(db.text('DELETE FROM game_plan WHERE season = :season'), {'season': season})
+            plan.to_sql('game_plan', con=connection, if_exists='append', index=False)
+
+    query = db.text('SELECT * FROM game_plan WHERE season >= :start AND season < :end ORDER BY season, date, game_id')
+    return pd.read_sql(query, con=engine, params={'start': int(start), 'end': int(end)})
+
+def crawl_queue(start=1997, end=2020, refresh=False, replan=False, db_url=DB_URL):
+    '''
+    Returns the games between two seasons that still need their play-by-play scraped
+    
+    Games with a table in nfl.db already are dropped unless refresh is True.
+    The queue is ordered most recent season first, then by date within a season
+    
+    parameters:
+        start : int; first season (default 1997)
+        end : int; season to stop before (default 2020)
+        refresh : boolean (default False); if True, re-queues games already in the db
+        replan : boolean or iterable of ints (default False); seasons to re-plan (see build_game_plan)
+        db_url : str; SQLAlchemy url of the db (default DB_URL)
+        
+    returns:
+        queue - pandas.DataFrame of game_plan rows with a priority column (0 = crawl first)
+    '''
+    queue = build_game_plan(start, end, replan=replan, db_url=db_url)
+    if not refresh:
+        engine = db.create_engine(db_url, echo=False)
+        scraped = set(db.inspect(engine).get_table_names())
+        queue = queue[~queue['game_id'].isin(scraped)]
+
+    queue = queue.sort_values(['season', 'date', 'game_id'], ascending=[False, True, True])
+    queue = queue.reset_index(drop=True)
+    queue['priority'] = np.arange(len(queue))
+
+    return queue
+
+def construct_pbp_db(start=1997, end=2020, refresh=False, replan=False, db_url=DB_URL):
     '''
     Constructs database of every NFL play
     
-    Loops through each NFL season (default 2020 - 1997).
-    Scrapes pro-football reference for the NFL Schedule that year
-    Then scrapes each individual game in that season
+    Plans every game from start to end (see build_game_plan), then scrapes
+    each game in the crawl queue that isn't in the db yet
     Dumps results to our local db file (could host this on a MySQL server)
     
     parameters:
         start : str or int; beginning year (default 1997)
         end : str or int; ending year for search (default 2020)
+        refresh : boolean (default False); if True, re-scrapes games already in the db
+        replan : boolean or iterable of ints (default False); seasons whose schedule is re-scraped
+                 and game list rebuilt before crawling, i.e. [2020] after postponements
+        db_url : str; SQLAlchemy url of the db to build (default DB_URL)
         
     '''
-#   Loops through each game in a season (can be changed) and produces play-by-play log for each game in that season
-    engine = db.create_engine('sqlite:///../db/nfl.db', echo=False)
-
-    for year in range(start, end):
-        print(year)
-        sched = get_nfl_schedule(year)
-        
-        #    Writing schedule df to a db to test out sqlalchemy
-        print('#######################################')
-        
-        with engine.begin() as connection:
-            sched.to_sql(f'schedule{year}', con=connection, if_exists='replace')
+    engine = db.create_engine(db_url, echo=False)
+    queue = crawl_queue(int(start), int(end), refresh=refresh, replan=replan, db_url=db_url)
+    print(f'{len(queue)} games to scrape')
 
-            print('db queried!')
-        print('#######################################')
+    season = None
+    for game in queue.itertuples(index=False):
+        if season is not None and game.season != season:
+#            Don't want PFR to mark our IP address, now would we?
+            time.sleep(10)
+        season = game.season
 
-        for index, row in sched.iterrows():
-            print(f"{row['Home Team']} vs. {row['Away Team']} {row['Date']}")
-            game_date = row['Date Formatted']
-            home_team = team_codes[row['Home Team']]
-            url = f"https://widgets.sports-reference.com/wg.fcgi?css=1&site=pfr&url=%2Fboxscores%2F{game_date}0{home_team}.htm&div=div_pbp"
-            print(f'Scrape URL: {url}')
+        print(f"{game.home_team} vs. {game.away_team} {game.date}")
+        print(f'Scrape URL: {game.url}')
+        
+        try:
+#            Grabbing play-by-play
+            df = get_pbp(game.url)
             
-            try:
-#                Grabbing play-by-play
-                df = get_pbp(url)
-                
-                print(df.head())
-                with engine.begin() as connection:
-                    df.to_sql(f'{home_team}{game_date}', con=connection, if_exists='replace')
+            print(df.head())
+            with engine.begin() as connection:
+                df.to_sql(game.game_id, con=connection, if_exists='replace')
 
-                    print('Play-by-Play inserted into db!')
-            except:
-                pass
-            
-            print('--------------------------------------------------------------')
+                print('Play-by-Play inserted into db!')
+        except Exception as e:
+            print(f'Could not scrape {game.game_id}: {e}')
         
-#        Don't want PFR to mark our IP address, now would we?
-        time.sleep(10)
-    print('SQLite DB created: ../db/nfl.db')
+        print('--------------------------------------------------------------')
+    
+    print(f'SQLite DB created: {db_url}')
 
-def query_pbp_db(query="SELECT * FROM "):
+def query_pbp_db(query="SELECT * FROM ", chunksize=None, db_url=DB_URL):
     '''
     Queries our local nfl.db file (or the one created by construct_pbp_db)
     
     Utilizes pandas.read_sql functionality to enact the query
+    
+    parameters:
+        query : str; SQL query to run against nfl.db
+        chunksize : int (default None); if set, returns a generator of DataFrames
+                    (see stream_pbp_db) rather than loading the full result at once
+        db_url : str; SQLAlchemy url of the db (default DB_URL)
     '''
-    engine = db.create_engine('sqlite:///../db/nfl.db', echo=False)
-    tables = engine.table_names()
+    if chunksize is not None:
+        return stream_pbp_db(query, chunksize=chunksize, db_url=db_url)
 
+    engine = db.create_engine(db_url, echo=False)
     df = pd.read_sql(query, con=engine)
 #    db.clear_compiled_cache()
     
     return df
 
+def type_pbp_chunk(df):
+    '''
+    Coerces the common play-by-play columns of a DataFrame to the types in pbp_dtypes
+    
+    Numeric columns are coerced with errors='coerce', so quarter header rows
+    and blank downs become NaN instead of raising
+    '''
+    for c, dtype in pbp_dtypes.items():
+        if c not in df.columns:
+            continue
+        if dtype == 'object':
+            df[c] = df[c].astype(object).where(df[c].notna(), None)
+        else:
+            df[c] = pd.to_numeric(df[c], errors='coerce').astype(dtype)
+    return df
+
+def stream_pbp_db(query, chunksize=10000, db_url=DB_URL):
+    '''
+    Runs a query against nfl.db and yields the result as typed DataFrame chunks
+    
+    Rows are fetched through a server-side cursor, so only one chunk
+    is held in memory at a time regardless of the size of the result
+    
+    parameters:
+        query : str; SQL query to run
+        chunksize : int (default 10000); # of rows per chunk
+        db_url : str; SQLAlchemy url of the db (default DB_URL)
+    
+    yields:
+        pandas.DataFrame objects of at most chunksize rows
+    '''
+    engine = db.create_engine(db_url, echo=False)
+    with engine.connect() as connection:
+        connection = connection.execution_options(stream_results=True)
+        for chunk in pd.read_sql(query, con=connection, chunksize=chunksize):
+            yield type_pbp_chunk(chunk)
+
+def game_season(game_date):
+    '''
+    Returns the NFL season a game date (YYYYMMDD) belongs to
+    
+    Games played in January/February count towards the previous season
+    '''
+    year, month = int(game_date[:4]), int(game_date[4:6])
+    return year if month >= 3 else year - 1
+
+def select_game_tables(engine, seasons=None, teams=None):
+    '''
+    Returns the names of the play-by-play tables matching a season/team filter
+    
+    Team filters are resolved against the schedule<year> tables so away games are included,
+    falling back on the home team code in the table name for seasons without a schedule
+    
+    parameters:
+        engine : sqlalchemy engine connected to nfl.db
+        seasons : iterable of ints (default None); seasons to include, all if None
+        teams : iterable of str (default None); full team names (keys of team_codes), all if None
+    '''
+    table_names = db.inspect(engine).get_table_names()
+    seasons = None if seasons is None else set(int(s) for s in seasons)
+
+    games = []
+    for t in table_names:
+        m = game_table_pattern.match(t)
+        if m is None:
+            continue
+        if seasons is not None and game_season(m.group(2)) not in seasons:
+            continue
+        games.append(t)
+
+    if teams is None:
+        return sorted(games)
+
+    teams = list(teams)
+    codes = set(team_codes[t] for t in teams)
+    schedules = set(t for t in table_names if t.startswith('schedule'))
+    selected = set()
+    with engine.connect() as connection:
+        for season in sorted(set(game_season(game_table_pattern.match(t).group(2)) for t in games)):
+            if f'schedule{season}' not in schedules:
+                print(f'No schedule table for {season}, filtering on home team only')
+                selected.update(t for t in games if t[:3] in codes)
+                continue
+#            Pushing the team filter down into the schedule query
+            params = {f't{i}': t for i, t in enumerate(teams)}
+            names = ', '.join(f':{k}' for k in params)
+            q = db.text(f'SELECT "Home Team", "Date Formatted" FROM schedule{season} '
+                        f'WHERE "Home Team" IN ({names}) OR "Away Team" IN ({names})')
+            for home, date in connection.execute(q, params):
+                if home in team_codes:
+                    selected.add(f'{team_codes[home]}{date}')
+
+    return sorted(t for t in games if t in selected)
+
+def iter_pbp(seasons=None, teams=None, columns=None, chunksize=10000, db_url=DB_URL):
+    '''
+    Iterates over every play in nfl.db matching a season/team filter in fixed-size chunks
+    
+    Projections and filters are pushed down into SQL: only the requested columns
+    of the selected games are ever read. Each game's plays are tagged with a game_id
+    (the table name) and re-chunked so every chunk but the last has exactly chunksize rows
+    
+    parameters:
+        seasons : iterable of ints (default None); seasons to include, all if None
+        teams : iterable of str (default None); full team names to include, all if None
+        columns : list of str (default None); play-by-play columns to select, all if None
+                  (team score columns are named per game, so pass columns for a fixed schema)
+        chunksize : int (default 10000); # of rows per chunk
+        db_url : str; SQLAlchemy url of the db (default DB_URL)
+    
+    yields:
+        pandas.DataFrame objects of chunksize rows
+    '''
+    engine = db.create_engine(db_url, echo=False)
+    projection = '*' if columns is None else ', '.join(f'"{c}"' for c in columns)
+
+    tables = select_game_tables(engine, seasons, teams)
+
+    buffer, n_buffered = [], 0
+    with engine.connect() as connection:
+        connection = connection.execution_options(stream_results=True)
+        for table in tables:
+            query = f"SELECT '{table}' AS game_id, {projection} FROM \"{table}\""
+            for chunk in pd.read_sql(query, con=connection, chunksize=chunksize):
+                buffer.append(type_pbp_chunk(chunk))
+                n_buffered += len(chunk)
+                while n_buffered >= chunksize:
+                    df = pd.concat(buffer, ignore_index=True)
+                    yield df.iloc[:chunksize]
+                    buffer, n_buffered = [df.iloc[chunksize:]], n_buffered - chunksize
+
+    if n_buffered > 0:
+        yield pd.concat(buffer, ignore_index=True)
+
+def export_pbp(path, fmt=None, seasons=None, teams=None, columns=None, chunksize=10000, db_url=DB_URL):
+    '''
+    Streams the play-by-play archive (or a season/team subset) to a Parquet or CSV file
+    
+    Only one chunk from iter_pbp is held in memory at a time, so peak memory
+    does not grow with the number of seasons exported
+    
+    parameters:
+        path : str; output file path
+        fmt : str (default None); 'parquet' or 'csv', inferred from the path extension if None
+        seasons, teams, columns, chunksize, db_url : passed through to iter_pbp;
+            columns defaults to the columns in pbp_dtypes so every chunk shares a schema
+    
+    returns:
+        n_rows : int; # of plays written
+    '''
+    if fmt is None:
+        fmt = 'parquet' if os.path.splitext(path)[1] in ('.parquet', '.pq') else 'csv'
+    if fmt not in ('parquet', 'csv'):
+        raise ValueError(f"fmt must be 'parquet' or 'csv', got {fmt}")
+    if columns is None:
+        columns = list(pbp_dtypes.keys())
+
+    chunks = iter_pbp(seasons=seasons, teams=teams, columns=columns, chunksize=chunksize, db_url=db_url)
+    n_rows = 0
+
+    if fmt == 'csv':
+        header = True
+        with open(path, 'w', newline='') as f:
+            for chunk in chunks:
+                chunk.to_csv(f, header=header, index=False)
+                header = False
+                n_rows += len(chunk)
+        return n_rows
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+#    Fixing the schema up front so all-null chunks don't change column types
+    arrow_types = {'object': pa.string(), 'float64': pa.float64()}
+    fields = [pa.field('game_id', pa.string())]
+    fields += [pa.field(c, arrow_types[pbp_dtypes.get(c, 'object')]) for c in columns]
+    schema = pa.schema(fields)
+
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            n_rows += len(chunk)
+    return n_rows
+
 def classify_play(series, detail):
     '''
     Maps play type from play-by-play description from PFR.
@@ -178,7 +502,7 @@ def classify_play(series, detail):
 if __name__=="__main__":
 #    Only need to call this to append to for 2021 (maybe 2020 season)
 #    construct_pbp_db(1999,2020)
-    eng = db.create_engine('sqlite:///../db/nfl.db', echo=False)
+    eng = db.create_engine(DB_URL, echo=False)
 #    tables = eng.get_table_names()
 #
 #    for t in tables[0:10]:
@@ -0,0 +1,164 @@
+# Script to benchmark how the scrapers, play-by-play db and odds functions scale on synthetic leagues
+# Fixtures come from syntheticLeague, so nothing is requested from PFR or the Odds-API
+#
+# Usage:
+#   python scalingBenchmarks.py                      # every benchmark at its default scales
+#   python scalingBenchmarks.py classify odds --scales 1 10 100 1000
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from unittest import mock
+import pandas as pd
+
+from syntheticLeague import SyntheticLeague, serve_fixtures
+
+
+# Base size of each benchmark, multiplied by the scale
+base_plays = 10000       # classify: play descriptions
+base_books = 10          # odds: bookmakers quoting each game
+base_teams = 32          # candlestick: teams in the league
+base_seasons = 1         # db: seasons crawled into nfl.db
+
+# Default scales; candlestick tops out at 100x since 3 letter codes only cover 17576 teams,
+# and db at 10x since a 100x crawl writes ~4.6M plays
+default_scales = {'classify': [1, 10, 100, 1000], 'odds': [1, 10, 100, 1000],
+                  'candlestick': [1, 10, 100], 'db': [1, 10]}
+
+
+@contextmanager
+def work_dir():
+    '''
+    Runs the block from a temporary src/ directory with empty ../data and ../db next to it,
+    so the relative paths the scrapers write to stay inside the temp dir
+    '''
+    root = tempfile.mkdtemp(prefix='nfl-bench-')
+    for d in ['src', os.path.join('data', 'standings'), os.path.join('data', 'stats'), 'db']:
+        os.makedirs(os.path.join(root, d))
+    cwd = os.getcwd()
+    os.chdir(os.path.join(root, 'src'))
+    try:
+        yield root
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
+
+def measure(fn, *args, **kwargs):
+    '''
+    Runs fn with stdout silenced and returns (result, seconds, peak python-allocated MB)
+    '''
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+def report(name, scale, n, unit, elapsed, peak_mb):
+    print(f'{name:<22} {scale:>6}x {n:>10} {unit:<8} {elapsed:>9.3f}s {n / elapsed:>12.0f} {unit}/s {peak_mb:>9.1f} MB')
+
+def bench_classify(scales):
+    '''
+    classify_play over synthetic PFR Detail strings
+    '''
+    from pbpAnalysis import classify_play
+
+    league = SyntheticLeague(n_teams=32)
+    game = league.schedule(2020).iloc[0]
+    home = game['Loser/tie'] if game['Unnamed: 5'] == '@' else game['Winner/tie']
+    details = list(league.pbp(game['Date'].replace('-', ''), league.teams[home])['Detail'].iloc[1:])
+
+    for scale in scales:
+        n = base_plays * scale
+        sample = (details * (n // len(details) + 1))[:n]
+        _, elapsed, peak = measure(lambda: [classify_play([d], d) for d in sample])
+        report('classify_play', scale, n, 'plays', elapsed, peak)
+
+def bench_odds(scales):
+    '''
+    bestOddsByOutcome on Odds-API JSON, and getBestOdds on the same events in the saved-csv format
+    '''
+    from oddsMaker import bestOddsByOutcome, getBestOdds
+
+    league = SyntheticLeague(n_teams=32)
+    for scale in scales:
+        n_books = base_books * scale
+        events = league.odds_events(2020, week=1, n_books=n_books)
+        quotes = len(events) * n_books
+
+        _, elapsed, peak = measure(lambda: [bestOddsByOutcome(e) for e in events])
+        report('bestOddsByOutcome', scale, quotes, 'quotes', elapsed, peak)
+
+#        Same layout as the csvs oddsMaker saved from the API (one row per bookmaker, dicts as strings)
+        frames = []
+        for e in events:
+            df = pd.DataFrame(e)
+            df['bookmakers'] = df['bookmakers'].astype(str)
+            frames.append(df)
+        _, elapsed, peak = measure(lambda: [getBestOdds(df) for df in frames])
+        report('getBestOdds', scale, quotes, 'quotes', elapsed, peak)
+
+def bench_candlestick(scales):
+    '''
+    nflDataScraper.candlestick_stats (standings, schedule, offense & defense tables) on growing leagues
+    '''
+    from nflDataScraper import nflDataScraper
+
+    for scale in scales:
+        n_teams = base_teams * scale
+        league = SyntheticLeague(n_teams=n_teams)
+        with work_dir(), serve_fixtures(league):
+            df, elapsed, peak = measure(nflDataScraper(season=2020).candlestick_stats)
+        if len(df) != n_teams or df[['TO', 'PD']].isna().any().any():
+            raise RuntimeError(f'candlestick_stats returned {len(df)} teams with missing stats, expected {n_teams}')
+        report('candlestick_stats', scale, len(df), 'teams', elapsed, peak)
+
+def bench_db(scales):
+    '''
+    construct_pbp_db into a fresh nfl.db, then reading every play back with query_pbp_db and iter_pbp
+    '''
+    import pbpAnalysis
+
+    for scale in scales:
+        seasons = range(2000, 2000 + base_seasons * scale)
+        league = SyntheticLeague(n_teams=32, seasons=seasons)
+        with work_dir() as root, serve_fixtures(league), mock.patch('time.sleep'):
+#            Pointing every call at the temp db so a user's NFL_DB_URL is never written to or timed
+            db_url = f"sqlite:///{os.path.join(root, 'db', 'nfl.db')}"
+            _, elapsed, peak = measure(pbpAnalysis.construct_pbp_db, seasons.start, seasons.stop, db_url=db_url)
+            games = pbpAnalysis.select_game_tables(pbpAnalysis.db.create_engine(db_url))
+            report('construct_pbp_db', scale, len(games), 'games', elapsed, peak)
+
+            def query_all():
+                return sum(len(pbpAnalysis.query_pbp_db(f'SELECT * FROM "{g}"', db_url=db_url)) for g in games)
+
+            def load_all():
+                return len(pd.concat([pbpAnalysis.query_pbp_db(f'SELECT * FROM "{g}"', db_url=db_url) for g in games]))
+
+            def stream_all():
+                return sum(len(chunk) for chunk in pbpAnalysis.iter_pbp(columns=list(pbpAnalysis.pbp_dtypes), db_url=db_url))
+
+            for name, fn in [('query_pbp_db', query_all), ('query_pbp_db + concat', load_all),
+                             ('iter_pbp', stream_all)]:
+                n, elapsed, peak = measure(fn)
+                report(name, scale, n, 'plays', elapsed, peak)
+
+benchmarks = {'classify': bench_classify, 'odds': bench_odds,
+              'candlestick': bench_candlestick, 'db': bench_db}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Scaling benchmarks on synthetic leagues')
+    parser.add_argument('benchmarks', nargs='*', choices=list(benchmarks), default=list(benchmarks))
+    parser.add_argument('--scales', nargs='+', type=int, help='scale factors (default per benchmark)')
+    args = parser.parse_args()
+
+    print(f'{"benchmark":<22} {"scale":>7} {"n":>10} {"":<8} {"time":>10} {"throughput":>19} {"peak mem":>12}')
+    for name in args.benchmarks:
+        benchmarks[name](args.scales or default_scales[name])
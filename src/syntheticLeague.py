@@ -0,0 +1,335 @@
+# Script to generate synthetic NFL-style leagues for scale testing
+# Produces PFR-style HTML fixtures (schedules, play-by-play, standings, offense/defense tables)
+# and Odds-API JSON for any number of teams, seasons and bookmakers
+
+import io
+import re
+import zlib
+import datetime as dt
+from contextlib import contextmanager
+import pandas as pd
+import numpy as np
+
+
+divisions = ['AFC East', 'AFC North', 'AFC South', 'AFC West',
+             'NFC East', 'NFC North', 'NFC South', 'NFC West']
+
+first_initials = list('ABCDJKMRST')
+last_names = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Davis', 'Miller', 'Wilson',
+              'Moore', 'Taylor', 'Thomas', 'Jackson', 'White', 'Harris', 'Martin', 'Allen']
+run_directions = ['left end', 'left tackle', 'left guard', 'up the middle',
+                  'right guard', 'right tackle', 'right end']
+pass_directions = ['short left', 'short middle', 'short right', 'deep left', 'deep middle', 'deep right']
+
+# Rough share of each play type in a real PFR play-by-play log
+play_mix = {'run': 0.42, 'pass': 0.40, 'sack': 0.03, 'punt': 0.05,
+            'kickoff': 0.05, 'fg': 0.03, 'timeout': 0.02}
+
+schedule_pattern = re.compile(r'pro-football-reference\.com/years/(\d{4})/games\.htm')
+standings_pattern = re.compile(r'pro-football-reference\.com/years/(\d{4})/$')
+defense_pattern = re.compile(r'pro-football-reference\.com/years/(\d{4})/opp\.htm')
+offense_pattern = re.compile(r'url=%2Fyears%2F(\d{4})%2F(?:index\.htm)?&div=div_team_stats')
+pbp_pattern = re.compile(r'url=%2Fboxscores%2F(\d{8})0([a-z]{3})\.htm&div=div_pbp')
+
+
+def team_code(i):
+    '''
+    Returns a 3 letter lowercase team code for team number i (aaa, aab, ...)
+    '''
+    return ''.join(chr(ord('a') + (i // 26**k) % 26) for k in (2, 1, 0))
+
+def make_teams(n_teams):
+    '''
+    Returns dict {<team name>: <team code>} for n_teams synthetic teams, same shape as pbpAnalysis.team_codes
+    '''
+    if n_teams > 26**3:
+        raise ValueError(f'At most {26**3} teams fit in 3 letter team codes, got {n_teams}')
+    return {f'Synthetic {team_code(i).upper()}': team_code(i) for i in range(n_teams)}
+
+def _rng(*keys):
+    return np.random.default_rng(zlib.crc32('-'.join(str(k) for k in keys).encode()))
+
+def _player(rng):
+    return f'{rng.choice(first_initials)}.{rng.choice(last_names)}'
+
+def prob_to_american(q):
+    '''
+    Converts an implied win probability to american odds
+    '''
+    q = np.asarray(q, dtype=float)
+    return np.where(q >= 0.5, -100 * q / (1 - q), 100 * (1 - q) / q).round().astype(int)
+
+
+class SyntheticLeague(object):
+    '''
+    Generates a synthetic league whose fixtures are served under the real PFR/Odds-API urls
+
+    Every table is generated on demand from a seed derived from its url, so the same league
+    always produces the same fixtures and nothing but the schedules is held in memory.
+
+    class parameters:
+        n_teams - int (default 32); # of teams in the league
+        seasons - iterable of ints (default [2020]); seasons to generate
+        n_books - int (default 8); # of bookmakers quoting each game
+        plays_per_game - int (default 170); average # of plays in each play-by-play log
+        seed - int (default 0); base random seed
+    '''
+
+    def __init__(self, n_teams=32, seasons=(2020,), n_books=8, plays_per_game=170, seed=0):
+        self.teams = make_teams(n_teams)
+        self.codes = {c: t for t, c in self.teams.items()}
+        self.seasons = list(seasons)
+        self.n_books = n_books
+        self.plays_per_game = plays_per_game
+        self.seed = seed
+        self.strength = pd.Series(_rng(seed, 'strength').normal(0, 6, n_teams), index=list(self.teams))
+        self._schedules = {}
+
+    def schedule(self, season):
+        '''
+        Returns the season's results in the format of the PFR games.htm table
+
+        Each week teams are paired at random (one team sits out if there's an odd number)
+        and the winner is drawn from the strength gap plus home field
+        '''
+        if season in self._schedules:
+            return self._schedules[season]
+
+        rng = _rng(self.seed, 'schedule', season)
+        teams = np.array(list(self.teams))
+        sept1 = dt.date(season, 9, 1)
+        opening_sunday = sept1 + dt.timedelta(days=(6 - sept1.weekday()) % 7 + 7)
+
+        weeks = []
+        for week in range(1, 18):
+            order = rng.permutation(len(teams))
+            home, away = teams[order[0:len(order) - 1:2]], teams[order[1::2]]
+            margin = self.strength[home].values - self.strength[away].values + 2 + rng.normal(0, 13.5, len(home))
+            home_won = margin > 0
+            pts_w = rng.integers(17, 38, len(home))
+            pts_l = np.maximum(pts_w - np.maximum(np.abs(margin).round().astype(int), 1), 0)
+            weeks.append(pd.DataFrame({
+                'Week': str(week), 'Day': 'Sun',
+                'Date': (opening_sunday + dt.timedelta(weeks=week - 1)).isoformat(), 'Time': '1:00PM',
+                'Winner/tie': np.where(home_won, home, away),
+                'Unnamed: 5': np.where(home_won, '', '@'),
+                'Loser/tie': np.where(home_won, away, home),
+                'Unnamed: 7': 'boxscore', 'PtsW': pts_w, 'PtsL': pts_l,
+                'YdsW': rng.integers(250, 480, len(home)), 'TOW': rng.poisson(1.1, len(home)),
+                'YdsL': rng.integers(200, 430, len(home)), 'TOL': rng.poisson(1.6, len(home))}))
+
+        df = pd.concat(weeks, ignore_index=True)
+        self._schedules[season] = df
+        return df
+
+    def standings(self, season):
+        '''
+        Returns the season's standings in the format of the PFR standings table (with division header rows)
+        '''
+        sched = self.schedule(season)
+        wins = sched['Winner/tie'].value_counts().reindex(list(self.teams), fill_value=0)
+        losses = sched['Loser/tie'].value_counts().reindex(list(self.teams), fill_value=0)
+        pf = (sched.groupby('Winner/tie')['PtsW'].sum().reindex(list(self.teams), fill_value=0)
+              + sched.groupby('Loser/tie')['PtsL'].sum().reindex(list(self.teams), fill_value=0))
+        pa = (sched.groupby('Winner/tie')['PtsL'].sum().reindex(list(self.teams), fill_value=0)
+              + sched.groupby('Loser/tie')['PtsW'].sum().reindex(list(self.teams), fill_value=0))
+
+        df = pd.DataFrame({'Tm': list(self.teams), 'W': wins.values, 'L': losses.values,
+                           'W-L%': (wins / (wins + losses)).round(3).values,
+                           'PF': pf.values, 'PA': pa.values, 'PD': (pf - pa).values})
+        df['MoV'] = (df['PD'] / (df['W'] + df['L'])).round(1)
+        df['Division'] = [divisions[i % len(divisions)] for i in range(len(df))]
+
+        # Playoff teams get PFR's */+ markers
+        df.loc[df['W'] >= df['W'].quantile(0.8), 'Tm'] += '*'
+
+        rows = []
+        for division, teams in df.groupby('Division'):
+            rows.append(pd.DataFrame([[division] * (len(df.columns) - 1)], columns=df.columns[:-1]))
+            rows.append(teams.drop('Division', axis=1))
+        return pd.concat(rows, ignore_index=True)
+
+    def team_stats(self, season, defense=False):
+        '''
+        Returns the season's team offense (or defense) table in PFR's two-level column format,
+        with the Avg Team/League Total/Avg Tm/G summary rows
+        '''
+        rng = _rng(self.seed, 'defense' if defense else 'offense', season)
+        standings = self.standings(season)
+        standings = standings.loc[~standings['Tm'].isin(divisions)]
+        n = len(standings)
+
+        plays = rng.integers(950, 1150, n)
+        yds = (plays * rng.normal(5.4, 0.5, n)).round().astype(int)
+        cols = [('', 'Rk'), ('', 'Tm'), ('', 'G'), ('', 'PF'),
+                ('Tot Yds & TO', 'Yds'), ('Tot Yds & TO', 'Ply'), ('Tot Yds & TO', 'Y/P'),
+                ('Tot Yds & TO', 'TO'), ('Tot Yds & TO', 'FL'), ('', '1stD'),
+                ('Passing', 'Cmp'), ('Passing', 'Att'), ('Passing', 'Yds'), ('Passing', 'TD'),
+                ('Passing', 'Int'), ('Passing', 'NY/A'),
+                ('Rushing', 'Att'), ('Rushing', 'Yds'), ('Rushing', 'TD'), ('Rushing', 'Y/A'),
+                ('Penalties', 'Pen'), ('Penalties', 'Yds'), ('', 'Sc%'), ('', 'TO%')]
+        fumbles = rng.poisson(8, n)
+        ints = rng.poisson(12, n)
+        pass_att = rng.integers(480, 680, n)
+        rush_att = plays - pass_att
+        pass_yds = (yds * rng.uniform(0.55, 0.7, n)).round().astype(int)
+        rush_yds = yds - pass_yds
+        values = [np.arange(1, n + 1), standings['Tm'].str.rstrip('*+').values, np.full(n, 17),
+                  (standings['PA'] if defense else standings['PF']).values,
+                  yds, plays, (yds / plays).round(1), fumbles + ints, fumbles, rng.integers(280, 400, n),
+                  (pass_att * rng.uniform(0.58, 0.7, n)).round().astype(int), pass_att, pass_yds,
+                  rng.poisson(25, n), ints, (pass_yds / pass_att).round(1),
+                  rush_att, rush_yds, rng.poisson(14, n), (rush_yds / rush_att).round(1),
+                  rng.poisson(100, n), rng.integers(600, 1000, n),
+                  rng.uniform(30, 50, n).round(1), rng.uniform(8, 16, n).round(1)]
+        df = pd.DataFrame(dict(zip(range(len(cols)), values)))
+
+        summary = df.drop([0, 1], axis=1).mean().round(1)
+        for label, row in [('Avg Team', summary), ('League Total', summary * n), ('Avg Tm/G', summary / 17)]:
+            df.loc[len(df)] = [None, label] + list(row.round(1))
+        df.columns = pd.MultiIndex.from_tuples(cols)
+        return df
+
+    def pbp(self, game_date, home_code):
+        '''
+        Returns a play-by-play log in the format of the PFR boxscore pbp table
+
+        The first row is a quarter header, as on PFR (get_pbp drops it)
+        '''
+        rng = _rng(self.seed, 'pbp', game_date, home_code)
+        sched = self.schedule(int(game_date[:4]) if int(game_date[4:6]) >= 3 else int(game_date[:4]) - 1)
+        date = f'{game_date[:4]}-{game_date[4:6]}-{game_date[6:]}'
+        home = self.codes[home_code]
+        game = sched.loc[(sched['Date'] == date) & ((sched['Winner/tie'] == home) | (sched['Loser/tie'] == home))]
+        if len(game) == 0:
+            raise ValueError(f'No game for {home_code} on {game_date}')
+        game = game.iloc[0]
+        away = game['Loser/tie'] if game['Winner/tie'] == home else game['Winner/tie']
+        home_abbr, away_abbr = home_code.upper(), self.teams[away].upper()
+
+        n = max(int(rng.normal(self.plays_per_game, 12)), 20)
+        kinds = rng.choice(list(play_mix), size=n, p=list(play_mix.values()))
+        yards = rng.integers(-3, 25, n)
+        offense = np.where(rng.random(n) < 0.5, home_abbr, away_abbr)
+
+        details = []
+        for kind, y, tm in zip(kinds, yards, offense):
+            p1, p2 = _player(rng), _player(rng)
+            if kind == 'run':
+                details.append(f'{p1} {rng.choice(run_directions)} for {y} yards (tackle by {p2})')
+            elif kind == 'pass':
+                details.append(f'{p1} pass complete {rng.choice(pass_directions)} to {p2} for {y} yards')
+            elif kind == 'sack':
+                details.append(f'{p1} sacked by {p2} for {-abs(y)} yards')
+            elif kind == 'punt':
+                details.append(f'{p1} punts {35 + abs(y)} yards, returned by {p2} for {abs(y) // 3} yards')
+            elif kind == 'kickoff':
+                details.append(f'{p1} kicks off 65 yards, touchback.')
+            elif kind == 'fg':
+                details.append(f'{p1} {20 + abs(y)} yard field goal good')
+            else:
+                details.append(f'Timeout #{rng.integers(1, 4)} by {self.codes[home_code] if tm == home_abbr else away}')
+
+        quarter = (np.arange(n) * 4 // n + 1).astype(str)
+        seconds = 900 - (np.arange(n) % max(n // 4, 1)) * 900 // max(n // 4, 1)
+        down = np.where(np.isin(kinds, ['kickoff', 'timeout']), '', rng.integers(1, 5, n).astype(str))
+        scored = np.isin(kinds, ['fg'])
+        ep = rng.normal(1.5, 1.8, n).round(2)
+
+        df = pd.DataFrame({'Quarter': quarter,
+                           'Time': [f'{s // 60}:{s % 60:02d}' for s in seconds],
+                           'Down': down,
+                           'ToGo': np.where(down == '', '', rng.integers(1, 15, n).astype(str)),
+                           'Location': [f'{tm} {yl}' for tm, yl in zip(offense, rng.integers(1, 50, n))],
+                           'Detail': details,
+                           away_abbr: np.cumsum(scored & (offense == away_abbr)) * 3,
+                           home_abbr: np.cumsum(scored & (offense == home_abbr)) * 3,
+                           'EPB': ep, 'EPA': (ep + rng.normal(0, 1, n)).round(2)})
+        header = pd.DataFrame([['1st Quarter'] * len(df.columns)], columns=df.columns)
+        return pd.concat([header, df], ignore_index=True)
+
+    def html(self, url):
+        '''
+        Returns the HTML fixture served for a PFR url, or raises ValueError for urls the league doesn't cover
+        '''
+        m = schedule_pattern.search(url)
+        if m:
+            return self.schedule(int(m.group(1))).to_html(index=False)
+        m = standings_pattern.search(url)
+        if m:
+            return self.standings(int(m.group(1))).to_html(index=False)
+        m = defense_pattern.search(url)
+        if m:
+            return self.team_stats(int(m.group(1)), defense=True).to_html(index=False)
+        m = offense_pattern.search(url)
+        if m:
+            return self.team_stats(int(m.group(1))).to_html(index=False)
+        m = pbp_pattern.search(url)
+        if m:
+            return self.pbp(m.group(1), m.group(2)).to_html(index=False)
+        raise ValueError(f'No fixture for {url}')
+
+    def odds_events(self, season, week=1, n_books=None):
+        '''
+        Returns Odds-API style h2h events for one week of the season
+
+        Each bookmaker shades the true win probability with its own noise plus ~4.5% vig
+
+        parameters:
+            season - int; season the week belongs to
+            week - int (default 1); schedule week
+            n_books - int (default None); # of bookmakers, self.n_books if None
+        '''
+        n_books = self.n_books if n_books is None else n_books
+        rng = _rng(self.seed, 'odds', season, week, n_books)
+        sched = self.schedule(season)
+        games = sched.loc[sched['Week'] == str(week)]
+
+        events = []
+        matchups = zip(games['Date'], games['Winner/tie'], games['Unnamed: 5'], games['Loser/tie'])
+        for i, (date, winner, location, loser) in enumerate(matchups):
+            home, away = (loser, winner) if location == '@' else (winner, loser)
+            gap = self.strength[home] - self.strength[away] + 2
+            p_home = 1 / (1 + np.exp(-gap / 7.5))
+
+#            Clipped so both sides stay below 1 after vig (no book prices both teams as underdogs)
+            quotes = np.clip(p_home + rng.normal(0, 0.02, n_books), 0.03, 0.95)
+            home_prices = prob_to_american(quotes * 1.0225)
+            away_prices = prob_to_american((1 - quotes) * 1.0225)
+            bookmakers = [{'key': f'book{b:04d}', 'title': f'Book {b:04d}',
+                           'last_update': f'{date}T12:00:00Z',
+                           'markets': [{'key': 'h2h', 'outcomes': [
+                               {'name': home, 'price': int(home_prices[b])},
+                               {'name': away, 'price': int(away_prices[b])}]}]}
+                          for b in range(n_books)]
+            events.append({'id': f'{season}-{week}-{i:05d}', 'sport_key': 'americanfootball_nfl',
+                           'sport_title': 'NFL', 'commence_time': f'{date}T17:00:00Z',
+                           'home_team': home, 'away_team': away, 'bookmakers': bookmakers})
+        return events
+
+
+@contextmanager
+def serve_fixtures(league):
+    '''
+    Serves a SyntheticLeague's fixtures in place of the real sites while in the with block
+
+    pandas.read_html is pointed at the league's fixtures and the league's teams
+    are added to pbpAnalysis.team_codes, so the scrapers run unchanged
+    '''
+    import pbpAnalysis
+
+    read_html = pd.read_html
+
+    def read_fixture(io_or_url, *args, **kwargs):
+        if isinstance(io_or_url, str) and io_or_url.startswith('http'):
+            io_or_url = io.StringIO(league.html(io_or_url))
+        return read_html(io_or_url, *args, **kwargs)
+
+    pd.read_html = read_fixture
+    pbpAnalysis.team_codes.update(league.teams)
+    try:
+        yield league
+    finally:
+        pd.read_html = read_html
+        for t in league.teams:
+            pbpAnalysis.team_codes.pop(t, None)
@@ -0,0 +1,186 @@
+# Script to build a rank/percentile index over every team stat for each NFL season
+# Built from the team stat csvs written by turnoverDiffPredictor.getTOMargin and nflDataScraper.candlestick_stats
+
+import os
+import pandas as pd
+import numpy as np
+
+
+stats_dir = os.path.join('..', 'data', 'stats')
+
+# Stats where a lower value is better (rank 1 = lowest)
+# Duplicate PFR headers are numbered by read_csv: Yds.1/Att.1/TD.1/1stD.1 = passing,
+# Yds.2/TD.2/1stD.2 = rushing (rushing Att is Att.1), Yds.3 = penalties, Yds.4/Pts/Plays = per drive.
+# On defense every yardage, completion, attempt and first down column is what the defense allowed
+lower_is_better = ['Off TO', 'Off FL', 'Off Int', 'Off Pen', 'Off Yds.3', 'Off TO%',
+                   'Def PF', 'Def Yds', 'Def Ply', 'Def Y/P', 'Def 1stD',
+                   'Def Cmp', 'Def Att', 'Def Yds.1', 'Def TD', 'Def NY/A', 'Def 1stD.1',
+                   'Def Att.1', 'Def Yds.2', 'Def TD.1', 'Def Y/A', 'Def 1stD.2',
+                   'Def 1stPy', 'Def Sc%', 'Def Yds.4', 'Def Pts', 'Def Plays']
+
+
+def load_team_panel(start=2003, end=2021, data_dir=os.path.join('..', 'data')):
+    '''
+    Reads the saved offense, defense and candlestick stats into one team-season panel
+
+    Seasons without saved stats are skipped, run getTOMargin/candlestick_stats for them first.
+    Candlestick csvs saved without team names (written with index=False) are skipped too
+
+    parameters:
+        start : int; first season (default 2003)
+        end : int; season to stop before (default 2021)
+        data_dir : str; directory the scrapers write to (default ../data)
+
+    returns:
+        panel - pandas.DataFrame indexed by (Season, Tm); columns prefixed with Off/Def,
+                candlestick stats (TO, CGR, PD) are left unprefixed
+    '''
+    seasons, missing = [], []
+    for season in range(start, end):
+        off_path = os.path.join(data_dir, 'stats', f'offenseStats-{season}.csv')
+        def_path = os.path.join(data_dir, 'stats', f'defenseStats-{season}.csv')
+        if not (os.path.exists(off_path) and os.path.exists(def_path)):
+            print(f'No saved team stats for {season}, skipping')
+            missing += [p for p in (off_path, def_path) if not os.path.exists(p)]
+            continue
+
+        frames = []
+        for path, prefix in [(off_path, 'Off'), (def_path, 'Def')]:
+            df = pd.read_csv(path, index_col=0).drop(['Rk', 'Tm', 'Tm.1', 'G'], axis=1, errors='ignore')
+            df.columns = [f'{prefix} {c}' for c in df.columns]
+            frames.append(df)
+
+        candlestick_path = os.path.join(data_dir, f'nfl-candlestick-stats-{season}.csv')
+        if os.path.exists(candlestick_path):
+            candlestick = pd.read_csv(candlestick_path, index_col=0)
+            if 'TO' in candlestick.columns:
+                frames.append(candlestick)
+            else:
+                print(f'{candlestick_path} has no team names, re-run candlestick_stats(save_csv=True) for {season}')
+
+        df = pd.concat(frames, axis=1)
+        df.index = pd.MultiIndex.from_product([[season], df.index], names=['Season', 'Tm'])
+        seasons.append(df)
+
+    if not seasons:
+        raise FileNotFoundError(f'No saved team stats for seasons {start}-{end - 1}, missing: {", ".join(missing)}')
+
+    panel = pd.concat(seasons)
+    return panel.apply(pd.to_numeric, errors='coerce').dropna(axis=1, how='all')
+
+def build_rank_index(panel, method='min', save=True, data_dir=os.path.join('..', 'data')):
+    '''
+    Ranks every team within its season for each numeric column of the panel
+
+    Ranks are computed per season in one vectorized groupby rank call (rank 1 = best).
+    Percentiles run from 0 to 1, with 1 the best team that season
+
+    parameters:
+        panel : pandas.DataFrame indexed by (Season, Tm), i.e. from load_team_panel
+        method : str (default 'min'); tie method passed to pandas rank ('min' matches league tables)
+        save : boolean (default True); if True, writes team-ranks.csv & team-percentiles.csv to data_dir/stats
+        data_dir : str; directory the panel was loaded from (default ../data), same as load_team_panel
+
+    returns:
+        TeamRankIndex over the panel
+    '''
+    panel = panel.select_dtypes('number')
+    ascending = np.array([c in lower_is_better for c in panel.columns])
+
+    by_season = panel.groupby(level='Season')
+    ranks = by_season.rank(method=method, ascending=False)
+    ranks.loc[:, ascending] = by_season.rank(method=method, ascending=True).loc[:, ascending]
+
+    pcts = by_season.rank(method='average', pct=True)
+    pcts.loc[:, ascending] = by_season.rank(method='average', ascending=False, pct=True).loc[:, ascending]
+
+    if save:
+        ranks.to_csv(os.path.join(data_dir, 'stats', 'team-ranks.csv'))
+        pcts.to_csv(os.path.join(data_dir, 'stats', 'team-percentiles.csv'))
+
+    return TeamRankIndex(ranks, pcts)
+
+
+class TeamRankIndex(object):
+    '''
+    Precomputed ranks & percentiles of every team stat by season
+
+    Queries are plain array lookups, nothing is re-scraped or re-sorted.
+
+    class parameters:
+        ranks - pandas.DataFrame indexed by (Season, Tm); rank of each team in each stat that season
+        pcts - pandas.DataFrame with the same index/columns as ranks; percentile of each team
+    '''
+
+    def __init__(self, ranks, pcts):
+        self.ranks = ranks.to_numpy(dtype=float)
+        self.pcts = pcts.to_numpy(dtype=float)
+        self.stats = list(ranks.columns)
+        self.rows = {key: i for i, key in enumerate(ranks.index)}
+        self.cols = {stat: j for j, stat in enumerate(self.stats)}
+
+    @classmethod
+    def load(cls, data_dir=stats_dir):
+        '''
+        Loads the index saved by build_rank_index
+
+        parameters:
+            data_dir : str; stats directory the index was written to (default ../data/stats)
+        '''
+        ranks = pd.read_csv(os.path.join(data_dir, 'team-ranks.csv'), index_col=[0, 1])
+        pcts = pd.read_csv(os.path.join(data_dir, 'team-percentiles.csv'), index_col=[0, 1])
+        return cls(ranks, pcts)
+
+    def _lookup(self, values, team, stat, seasons):
+        col = self.cols[stat]
+        seasons = [s for s in seasons if (s, team) in self.rows]
+        rows = [self.rows[(s, team)] for s in seasons]
+        return pd.Series(values[rows, col], index=pd.Index(seasons, name='Season'), name=stat)
+
+    def rank(self, team, stat, seasons):
+        '''
+        Returns a team's rank in a stat for each of the given seasons (seasons the team didn't play are left out)
+
+        parameters:
+            team : str; team name as on PFR, i.e. 'Tampa Bay Buccaneers'
+            stat : str; panel column, i.e. 'Off Y/P'
+            seasons : iterable of ints, i.e. range(2010, 2021)
+        '''
+        return self._lookup(self.ranks, team, stat, seasons)
+
+    def percentile(self, team, stat, seasons):
+        '''
+        Returns a team's percentile in a stat for each of the given seasons (1 = best in the league)
+        '''
+        return self._lookup(self.pcts, team, stat, seasons)
+
+    def team_ranks(self, teams, pct=False):
+        '''
+        Returns the rank (or percentile) of one team per season in every stat
+
+        parameters:
+            teams : dict or pandas.Series; {season: team}, i.e. Super Bowl winners by season
+            pct : boolean (default False); if True, returns percentiles rather than ranks
+
+        returns:
+            pandas.DataFrame indexed by (Season, Tm) with one column per stat
+        '''
+        teams = pd.Series(teams)
+        keys = [(s, t) for s, t in teams.items() if (s, t) in self.rows]
+        rows = [self.rows[k] for k in keys]
+        values = self.pcts if pct else self.ranks
+        index = pd.MultiIndex.from_tuples(keys, names=['Season', 'Tm'])
+        return pd.DataFrame(values[rows], index=index, columns=self.stats)
+
+
+if __name__ == "__main__":
+    from yardsPerPlay import superBowlWinners
+
+    panel = load_team_panel(2003, 2021)
+    index = build_rank_index(panel)
+
+    sb = superBowlWinners()
+    champions = sb.set_index('Season')['Winner']
+    ranks = index.team_ranks(champions)
+    print(ranks[['Off Y/P', 'Def Y/P', 'TO', 'PD']])
+    print(ranks.mean().sort_values())
@@ -0,0 +1,223 @@
+# Script to score the current NFL week with our team-strength model and find value against the best available odds
+# Joins get_nfl_schedule (pbpAnalysis), candlestick_stats (nflDataScraper) and Odds-API prices (oddsMaker)
+
+import os
+import datetime as dt
+import pandas as pd
+import numpy as np
+from scipy.stats import norm
+
+from nflDataScraper import nflDataScraper
+from oddsMaker import getNFLOdds, bestOddsByOutcome
+from pbpAnalysis import get_nfl_schedule, team_codes
+
+
+# Points a home team is worth, and the spread of NFL final margins around the expected margin
+home_field = 2.0
+margin_sd = 13.5
+# Points per turnover -- turnover margin doesn't carry over, so it's stripped out of point differential
+points_per_turnover = 4.0
+# Moves where PFR changed the team code too, so team_codes alone doesn't link the two names
+relocated_teams = {'St. Louis Rams': 'Los Angeles Rams', 'San Diego Chargers': 'Los Angeles Chargers'}
+
+
+def american_to_decimal(odds):
+    '''
+    Converts american odds (i.e. -150, +130) to decimal odds (total payout per unit staked)
+    '''
+    odds = np.asarray(odds, dtype=float)
+    return np.where(odds > 0, 1 + odds / 100, 1 + 100 / np.abs(odds))
+
+def kelly_fraction(p, odds):
+    '''
+    Returns the Kelly stake (fraction of bankroll) for a bet with win probability p at american odds
+
+    Negative-edge bets get a stake of 0
+    '''
+    b = american_to_decimal(odds) - 1
+    return np.clip((p * b - (1 - p)) / b, 0, None)
+
+def season_games(season):
+    '''
+    Returns games played per team in a season (or per team, from the saved standings if get_pt_diff wrote them)
+
+    returns:
+        int, or pandas.Series of W + L + T by team
+    '''
+    csv_path = os.path.join('..', 'data', 'standings', f'nfl_standings-{season}.csv')
+    if os.path.exists(csv_path):
+        standings = pd.read_csv(csv_path, index_col=0)
+        record = [c for c in ['W', 'L', 'T'] if c in standings.columns]
+        games = standings[record].apply(pd.to_numeric, errors='coerce').fillna(0).sum(axis=1)
+#        Teams without a game yet get no strength rather than a divide by zero
+        return games.where(games > 0)
+#    17-game schedule started in 2021
+    return 17 if int(season) >= 2021 else 16
+
+def team_strength(candlestick, games=17):
+    '''
+    Returns expected points-per-game margin for each team from its candlestick stats
+
+    Point differential per game, less the points its turnover margin was worth
+
+    parameters:
+        candlestick - pandas.DataFrame; output of nflDataScraper.candlestick_stats (TO, CGR, PD by team)
+        games - int or pandas.Series by team (default 17); games played for the season the stats cover
+    '''
+    return (candlestick['PD'] - points_per_turnover * candlestick['TO']) / games
+
+def season_finished(season, today=None):
+    '''
+    Returns True once a season's playoffs are over (March of the following year)
+    '''
+    today = dt.date.today() if today is None else today
+    return today >= dt.date(int(season) + 1, 3, 1)
+
+def franchise_strength(strength):
+    '''
+    Adds every other name a franchise has gone by (i.e. Oakland Raiders -> Las Vegas Raiders) to a strength series
+
+    Names are linked through their pbpAnalysis.team_codes code, plus relocated_teams for moves that changed the code
+    '''
+    codes = dict(team_codes)
+    for old, new in relocated_teams.items():
+        codes[old] = codes[new]
+    by_code = {}
+    for team in strength.index:
+        if team in codes:
+            by_code.setdefault(codes[team], team)
+
+    aliases = {name: strength[by_code[code]] for name, code in codes.items()
+               if name not in strength.index and code in by_code}
+    return pd.concat([strength, pd.Series(aliases, dtype=float)])
+
+def win_probability(home_strength, away_strength):
+    '''
+    Returns probability the home team wins given each team's expected per-game margin
+    '''
+    spread = home_strength - away_strength + home_field
+    return norm.cdf(spread / margin_sd)
+
+
+class WeeklyPicks(object):
+    '''
+    Scores a week of NFL games and compares model win probabilities to the best odds on the board
+
+    The schedule and candlestick stats are pulled once and kept on the object;
+    refresh() only re-scores games whose odds changed since the last call.
+
+    class parameters:
+        season - int; season being bet on
+        stats_season - int (default None); season whose candlestick stats feed the model, season - 1 if None
+        bankroll - float (default 100); bankroll Kelly stakes are sized against
+        kelly_multiplier - float (default 0.25); fraction of full Kelly to stake
+    '''
+
+    def __init__(self, season, stats_season=None, bankroll=100, kelly_multiplier=0.25):
+        self.season = season
+        self.stats_season = season - 1 if stats_season is None else stats_season
+        self.bankroll = bankroll
+        self.kelly_multiplier = kelly_multiplier
+        self.schedule = None
+        self.strength = None
+        self._scored = {}
+
+    def load(self):
+        '''
+        Pulls the season schedule and team strengths if they haven't been pulled yet
+
+        Candlestick stats saved by candlestick_stats(save_csv=True) are read instead of re-scraped
+        for finished seasons only, so stats for a season in progress are always current.
+        csvs saved without team names (written with index=False) are re-scraped too
+        '''
+        if self.schedule is None:
+            self.schedule = get_nfl_schedule(self.season)
+        if self.strength is None:
+            csv_path = os.path.join('..', 'data', f'nfl-candlestick-stats-{self.stats_season}.csv')
+            candlestick = None
+            if season_finished(self.stats_season) and os.path.exists(csv_path):
+                candlestick = pd.read_csv(csv_path, index_col=0)
+                if 'TO' not in candlestick.columns:
+                    print(f'{csv_path} has no team names, re-scraping')
+                    candlestick = None
+            if candlestick is None:
+                candlestick = nflDataScraper(season=self.stats_season).candlestick_stats(save_csv=True)
+            self.strength = franchise_strength(team_strength(candlestick, season_games(self.stats_season)))
+
+    def week_games(self, week=None, today=None):
+        '''
+        Returns this week's games from the schedule
+
+        parameters:
+            week - int or str (default None); schedule week, the next 7 days of games if None
+            today - datetime.date (default None); date to count the week from, today if None
+        '''
+        self.load()
+        sched = self.schedule
+        if week is not None:
+            return sched.loc[sched['Week'].astype(str) == str(week)]
+
+        today = dt.date.today() if today is None else today
+        dates = pd.to_datetime(sched['Date']).dt.date
+        return sched.loc[(dates >= today) & (dates < today + dt.timedelta(days=7))]
+
+    def _score_event(self, event, best):
+        home, away = event['home_team'], event['away_team']
+        p_home = float(win_probability(self.strength[home], self.strength[away]))
+
+        rows = []
+        for team, p in [(home, p_home), (away, 1 - p_home)]:
+            odds, book = best[team]
+            stake = self.kelly_multiplier * float(kelly_fraction(p, odds))
+            rows.append({'home_team': home, 'away_team': away, 'team': team,
+                         'win_prob': p, 'best_odds': odds, 'oddsmaker': book,
+                         'implied_prob': 1 / float(american_to_decimal(odds)),
+                         'ev': p * float(american_to_decimal(odds)) - 1,
+                         'kelly': stake, 'stake': stake * self.bankroll})
+        return rows
+
+    def refresh(self, events=None, week=None, today=None):
+        '''
+        Returns edge, expected value and Kelly stake for each side of every game this week
+
+        parameters:
+            events - list of Odds-API event dicts (default None); pulled with getNFLOdds if None
+            week, today - passed to week_games
+
+        returns:
+            slate - pandas.DataFrame with one row per team per game, sorted by expected value
+        '''
+        games = self.week_games(week, today)
+        matchups = set(zip(games['Home Team'], games['Away Team']))
+        events = getNFLOdds() if events is None else events
+
+        rows = []
+        for event in events:
+            if (event['home_team'], event['away_team']) not in matchups:
+                continue
+            best = bestOddsByOutcome(event)
+            if event['home_team'] not in best or event['away_team'] not in best:
+                continue
+            unrated = [t for t in (event['home_team'], event['away_team']) if pd.isna(self.strength.get(t))]
+            if unrated:
+                print(f"Skipping {event['away_team']} @ {event['home_team']}: no {self.stats_season} strength for {', '.join(unrated)}")
+                continue
+#            Games are only re-scored when their best prices move
+            key = tuple(sorted(best.items()))
+            cached = self._scored.get(event['id'])
+            if cached is None or cached[0] != key:
+                cached = (key, self._score_event(event, best))
+                self._scored[event['id']] = cached
+            rows.extend(cached[1])
+
+        slate = pd.DataFrame(rows, columns=['home_team', 'away_team', 'team', 'win_prob', 'best_odds',
+                                            'oddsmaker', 'implied_prob', 'ev', 'kelly', 'stake'])
+        slate['edge'] = slate['win_prob'] - slate['implied_prob']
+        return slate.sort_values('ev', ascending=False).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    picks = WeeklyPicks(season=2021)
+    slate = picks.refresh()
+    print(slate)
+    print(slate.loc[slate['ev'] > 0])
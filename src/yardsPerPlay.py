@@ -50,28 +50,27 @@ def superBowlWinners():
     return df
 
 if __name__ == "__main__":
+    from teamRanks import TeamRankIndex, load_team_panel
+
     sb = superBowlWinners()
-#    yardsPerPlay(2020)
     print(sb['Winner'])
+
+#    Looking up values & ranks in the saved stats/index (built by teamRanks.build_rank_index) rather than re-scraping each season
+    panel = load_team_panel(2003, 2021)
+    index = TeamRankIndex.load()
+    seasons = range(2020, 2002, -1)
+    champions = sb.loc[sb['Season'].isin(seasons)].set_index('Season')['Winner']
+    ranks = index.team_ranks(champions)['Off Y/P']
+
     yardage = []
-    ranks = []
-    for s in range(2020, 2002,-1):
-        print(s)
-        sb_winner = sb['Winner'].loc[sb['Season']==s].values[0]
-#        sb_winner = sb_winner['Winner']
-        print(f'Super Bowl Winner in {s}: {sb_winner}')
-        df = yardsPerPlay(s)
-        
-        avg_yds_rank = df.index[df['Tm']==sb_winner].values[0] + 1
-        avg_yds = df['Y/P'].loc[df['Tm']==sb_winner].values[0]
-        
+    for (s, sb_winner), avg_yds_rank in ranks.items():
+        avg_yds = panel.loc[(s, sb_winner), 'Off Y/P']
         yardage.append(avg_yds)
-        ranks.append(avg_yds_rank)
-        
+
+        print(f'Super Bowl Winner in {s}: {sb_winner}')
         print(f'{sb_winner} yards-per-play: {avg_yds}')
-        print(f'{s} NFL Rank: {avg_yds_rank}')
+        print(f'{s} NFL Rank: {int(avg_yds_rank)}')
         print('--------------------------------------')
 
-
     print(yardage)
-    print(ranks)
+    print(list(ranks.astype(int)))